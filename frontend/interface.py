@@ -1,5 +1,5 @@
 import os
-from typing import Callable, Tuple, Union, Dict, Optional, List
+from typing import Any, Callable, Tuple, Union, Dict, Optional, List
 
 import dearpygui.dearpygui as dpg
 import numpy as np
@@ -46,8 +46,9 @@ def render_image_window(image_name: str, movie: Optional[Movie] = None, pos: Uni
         width, height = calculate_image_window_size(image)
         hists = image.get_histograms()
 
+        user_data = build_image_window_user_data(image_name)
         window_label = f'Movie: {movie.name} - Frame {movie.current_frame}' if movie else image_name
-        with dpg.window(label=window_label, tag=f'image_window_{image_name}', width=width, height=height, pos=pos, no_scrollbar=False, no_resize=True, user_data={'image_name': image_name, 'hists_toggled': False, 'history_toggled': False, 'selections': []}, on_close=lambda: dpg.delete_item(window)) as window:
+        with dpg.window(label=window_label, tag=f'image_window_{image_name}', width=width, height=height, pos=pos, no_scrollbar=False, no_resize=True, user_data=user_data, on_close=lambda: dpg.delete_item(window)) as window:
             with dpg.menu_bar():
                 dpg.add_menu_item(label='Save', user_data=image_name, callback=lambda s, ad, ud: trigger_save_image_dialog(ud))
                 build_transformations_menu(image_name)
@@ -84,6 +85,22 @@ def render_image_window(image_name: str, movie: Optional[Movie] = None, pos: Uni
                     for i, tr in enumerate(image.transformations):
                         dpg.add_text(f'{i}. {tr}', tag=f'image_{image_name}_transformations_{i}')
 
+        # Los registries son items raiz => Los creamos fuera del contexto de la ventana
+        build_image_item_handler_registry(window, image_item, user_data)
+
+def build_image_window_user_data(image_name: str) -> Dict[str, Any]:
+    # Precalculamos los tags que usan los handlers del mouse, para no reconstruirlos en cada evento
+    return {
+        'image_name':       image_name,
+        'image_tag':        f'image_{image_name}',
+        'pointer_tag':      f'image_{image_name}_pointer',
+        'selection_tag':    f'image_{image_name}_selection',
+        'region_tag':       f'image_{image_name}_region',
+        'hists_toggled':    False,
+        'history_toggled':  False,
+        'selections':       [],
+    }
+
 def calculate_image_window_size(image: Image) -> Tuple[int, int]:
     # 120 = menu_bar + info_size, 10 = padding
     height = max(image.height, MIN_IMAGE_HEIGHT) + 120 + 10
@@ -237,11 +254,11 @@ def push_selection(image_name: str) -> None:
         return None
 
     selections.append((p1_ret, p2_ret))
-    current_selection = f'image_{image_name}_selection'
+    current_selection = user_data['selection_tag']
     saved_selection = f'saved_selection_{p1_ret}_{p2_ret}'
 
     if dpg.does_item_exist(current_selection):
-        dpg.delete_item(current_selection)
+        dpg.hide_item(current_selection)
 
     dpg.draw_rectangle(p1, p2, parent=window, tag=saved_selection, color=(0x00, 0xCC, 0x00, 200))
     
@@ -448,22 +465,20 @@ def build_load_metadata_dialog() -> None:
     with dpg.file_dialog(label='Choose metadata file to load...', tag=LOAD_METADATA_DIALOG, default_path='../images', directory_selector=False, show=False, modal=True, width=1024, height=512, callback=lambda s, ad: load_metadata_handler(ad)):
         dpg.add_file_extension('.tsv')
 
-def get_pixel_pos_in_image(window: Union[int, str], image_name: str) -> Tuple[int, int]:
+def get_pixel_pos_in_image(window: Union[int, str], user_data: Dict[str, Any]) -> Tuple[int, int]:
+    # La ventana se puede mover de muchas maneras (arrastrandola, o DearPyGui al redimensionar el viewport) => Su posicion se pide en cada evento.
+    # La posicion de la imagen dentro de la ventana solo cambia si la ventana cambia de tamaño => La cacheamos, y el resize handler la invalida.
+    if 'image_pos' not in user_data:
+        user_data['image_pos'] = dpg.get_item_pos(user_data['image_tag'])
+
     mouse_pos = dpg.get_mouse_pos(local=False)
     window_pos = dpg.get_item_pos(window)
-    img_pos = dpg.get_item_pos(f'image_{image_name}')
+    img_pos = user_data['image_pos']
     return int(mouse_pos[0] - window_pos[0] - img_pos[0]), int(mouse_pos[1] - window_pos[1] - img_pos[1])
 
 def is_image_window(window: Union[int, str]) -> bool:
     return isinstance(window, str) and window.startswith('image_window')
 
-def get_focused_hovered_image_window() -> Union[int, str]:
-    window = dpg.get_active_window()
-    if is_image_window(window) and dpg.is_item_hovered(window):
-        return window
-    else:
-        return 0
-
 @render_error
 def close_all_windows() -> None:
     for win_id in dpg.get_windows():
@@ -477,91 +492,125 @@ def get_image_window_rect_selections(window: Union[str, int]) -> List[Tuple[Tupl
     user_data = dpg.get_item_user_data(window)
     return user_data['selections']
 
-def build_image_handler_registry() -> None:
-    @render_error
-    def mouse_move_handler() -> None:
-        window = get_focused_hovered_image_window()
-
-        # Cleanup de las otras image windows
-        for win_id in dpg.get_windows():
-            win = dpg.get_item_alias(win_id)
-            if window != win and is_image_window(win):
-                user_data = dpg.get_item_user_data(win)
-                win_img_name = user_data['image_name']
-                pointer = f'image_{win_img_name}_pointer'
-                if dpg.does_item_exist(pointer):
-                    dpg.set_value(pointer, '')
-
-        if window == 0:
-            return  # No hay ninguna imagen seleccionada
+# Ventana de imagen cuyo puntero se esta mostrando. Permite limpiarlo sin recorrer todas las ventanas.
+_pointer_window: Dict[str, Any] = {'window': None, 'user_data': None}
 
-        user_data = dpg.get_item_user_data(window)
-        image_name: str = user_data['image_name']
-        pointer = f'image_{image_name}_pointer'
-        selection = f'image_{image_name}_selection'
+# Los eventos de hover y click se registran sobre cada imagen => DearPyGui solo los despacha si el mouse esta sobre ella
+# Los handlers capturan el user_data de la ventana. Es el mismo dict que guarda DearPyGui, asi que lo modificamos in place sin pedirlo en cada evento.
+def build_image_item_handler_registry(window: Union[int, str], image_item: Union[int, str], user_data: Dict[str, Any]) -> None:
+    registry = f'{user_data["image_tag"]}_handlers'
+    window_registry = f'{user_data["image_tag"]}_window_handlers'
+    for old_registry in (registry, window_registry):
+        if dpg.does_item_exist(old_registry):
+            dpg.delete_item(old_registry)  # Quedo de una ventana anterior de la misma imagen
 
-        if dpg.is_item_focused(window):
-            image = img_repo.get_image(image_name)
-            pixel = get_pixel_pos_in_image(window, image_name)
+    with dpg.item_handler_registry(tag=registry):
+        dpg.add_item_hover_handler(callback=lambda: image_hover_handler(window, user_data))
+        dpg.add_item_clicked_handler(callback=lambda: image_clicked_handler(window, user_data))
+    dpg.bind_item_handler_registry(image_item, registry)
 
-            if image.valid_pixel(pixel):
-                # Estamos en la imagen! -> Dibujamos
-                usr_data = dpg.get_item_user_data(window)
-                if 'init_draw' in usr_data and 'end_draw' not in usr_data:
-                    if dpg.does_item_exist(selection):
-                        dpg.delete_item(selection)
+    with dpg.item_handler_registry(tag=window_registry):
+        dpg.add_item_resize_handler(callback=lambda: user_data.pop('image_pos', None))
+    dpg.bind_item_handler_registry(window, window_registry)
 
+@render_error
+def image_hover_handler(window: Union[int, str], usr_data: Dict[str, Any]) -> None:
+    pointer = usr_data['pointer_tag']
+    selection = usr_data['selection_tag']
+
+    # El hover se dispara en todos los frames => Solo procesamos si cambio algo
+    focused = dpg.is_item_focused(window)
+    hover_state = (dpg.get_mouse_pos(local=False), focused)
+    if usr_data.get('hover_state') == hover_state:
+        return
+    usr_data['hover_state'] = hover_state
+
+    # Limpiamos el puntero de la ventana anterior
+    prev_window = _pointer_window['window']
+    if prev_window != window and prev_window is not None and dpg.does_item_exist(prev_window):
+        dpg.set_value(_pointer_window['user_data']['pointer_tag'], '')
+    _pointer_window['window'] = window
+    _pointer_window['user_data'] = usr_data
+
+    if focused:
+        image = img_repo.get_image(usr_data['image_name'])
+        pixel = get_pixel_pos_in_image(window, usr_data)
+
+        if image.valid_pixel(pixel):
+            # Estamos en la imagen! -> Dibujamos
+            if 'init_draw' in usr_data and 'end_draw' not in usr_data:
+                # El rectangulo se crea una unica vez. Despues solo actualizamos sus vertices.
+                if dpg.does_item_exist(selection):
+                    dpg.configure_item(selection, pmin=usr_data['init_draw'], pmax=pixel, show=True)
+                else:
                     dpg.draw_rectangle(usr_data['init_draw'], pixel, parent=window, tag=selection, color=(0xCC, 0x00, 0x66, 200))
 
-                dpg.show_item(pointer)
-                dpg.set_value(pointer, f"Pixel: {get_pixel_pos_in_image(window, image_name)}  Value: {np.around(image.get_pixel(pixel), 2)}")
-                return  # Terminamos de dibujar
+            dpg.show_item(pointer)
+            dpg.set_value(pointer, f"Pixel: {pixel}  Value: {np.around(image.get_pixel(pixel), 2)}")
+            return  # Terminamos de dibujar
 
-        # No estamos en la imagen -> Borramos el puntero. El rectangulo lo dejamos
-        dpg.set_value(pointer, '')
+    # No estamos en la imagen -> Borramos el puntero. El rectangulo lo dejamos
+    dpg.set_value(pointer, '')
 
-    @render_error
-    def mouse_down_handler():
-        window = get_focused_hovered_image_window()
+@render_error
+def image_clicked_handler(window: Union[int, str], usr_data: Dict[str, Any]) -> None:
+    pixel_pos = get_pixel_pos_in_image(window, usr_data)
 
-        # Cleanup de las otras image windows
-        # for win_id in dpg.get_windows():
-        #     win = dpg.get_item_alias(win_id)
-        #     if window != win and is_image_window(win):
-        #       No cleanupeamos nada. Queremos que el rectangulo sea persistente
+    if pixel_pos[0] < 0 or pixel_pos[1] < 0:
+      return
 
-        if window == 0:
-            return  # No hay ninguna imagen seleccionada
+    usr_data['init_draw'] = pixel_pos if ('init_draw' not in usr_data or 'end_draw' in usr_data) else usr_data['init_draw']
 
-        usr_data = dpg.get_item_user_data(window)
-        image_name: str = usr_data['image_name']
-        pixel_pos = get_pixel_pos_in_image(window, image_name)
+    usr_data.pop('end_draw', None)
 
-        if pixel_pos[0] < 0 or pixel_pos[1] < 0:
-          return
+def build_image_handler_registry() -> None:
+    # Frame en el que ya hay agendado un procesamiento del movimiento del mouse.
+    # El mouse puede generar muchos eventos por frame, pero solo nos interesa la ultima posicion.
+    scheduled_move = {'frame': -1}
 
-        usr_data['init_draw'] = pixel_pos if ('init_draw' not in usr_data or 'end_draw' in usr_data) else usr_data['init_draw']
+    @render_error
+    def mouse_move_handler() -> None:
+        next_frame = dpg.get_frame_count() + 1
+        if scheduled_move['frame'] != next_frame:
+            scheduled_move['frame'] = next_frame
+            dpg.set_frame_callback(next_frame, process_mouse_move)
 
-        usr_data.pop('end_draw', None)
-        dpg.set_item_user_data(window, usr_data)
+    @render_error
+    def process_mouse_move() -> None:
+        # Cuando el mouse sale de la imagen no hay evento de hover => Limpiamos aca el puntero
+        window = _pointer_window['window']
+        if window is None:
+            return
+
+        if not dpg.does_item_exist(window):
+            _pointer_window['window'] = _pointer_window['user_data'] = None  # Se cerro la ventana
+            return
+
+        usr_data = _pointer_window['user_data']
+        if not dpg.is_item_hovered(usr_data['image_tag']):
+            dpg.set_value(usr_data['pointer_tag'], '')
+            usr_data.pop('hover_state', None)
+            _pointer_window['window'] = _pointer_window['user_data'] = None
 
     @render_error
     def mouse_release_handler():
-        window = get_focused_hovered_image_window()
+        window = dpg.get_active_window()
+        if not is_image_window(window):
+            return  # No hay ninguna imagen seleccionada
 
-        if window == 0:
+        if not dpg.is_item_hovered(window):
             return  # No hay ninguna imagen seleccionada
 
         usr_data = dpg.get_item_user_data(window)
-        image_name: str = usr_data['image_name']
-        image = img_repo.get_image(image_name)
-        region = f'image_{image_name}_region'
-        selection = f'image_{image_name}_selection'
+
+        image = img_repo.get_image(usr_data['image_name'])
+        region = usr_data['region_tag']
+        selection = usr_data['selection_tag']
 
         if 'init_draw' not in usr_data or 'end_draw' in usr_data:
             return  # No se detecto el inicio del click (probablemente se este arrastrando la ventana), o ya procesamos el rectangulo
 
-        usr_data['end_draw'] = get_pixel_pos_in_image(window, image_name)
+        usr_data['end_draw'] = get_pixel_pos_in_image(window, usr_data)
         init_draw = usr_data['init_draw']
         end_draw = usr_data['end_draw']
 
@@ -569,20 +618,17 @@ def build_image_handler_registry() -> None:
         y = (int(min(end_draw[1], init_draw[1])), int(max(end_draw[1], init_draw[1])))
 
         if x[1] > x[0] and y[1] > y[0]:
-            if image.channels > 1:
-                # TODO: A veces lanza una excepcion: 'RuntimeWarning: Mean of empty slice.'
-                mean = np.mean(np.array(image.data[y[0]:y[1], x[0]:x[1]]).reshape((-1, 3)), axis=0)
-            else:
-                mean = np.mean(image.data[y[0]:y[1], x[0]:x[1]])
+            # Los extremos de la seleccion son inclusivos
+            region_data = image.data[y[0]:y[1] + 1, x[0]:x[1] + 1]
+            mean = region_data.mean(axis=(0, 1)) if image.channels > 1 else region_data.mean()
 
-            dpg.set_value(region, f"#Pixel: {np.prod((y[1] - y[0] + 1, x[1] - x[0] + 1))}  Avg: {np.around(mean, 2)}")
+            dpg.set_value(region, f"#Pixel: {(y[1] - y[0] + 1) * (x[1] - x[0] + 1)}  Avg: {np.around(mean, 2)}")
             dpg.show_item(region)
         else:
             dpg.set_value(region, '')
             if dpg.does_item_exist(selection):
-                dpg.delete_item(selection)
+                dpg.hide_item(selection)
 
     with dpg.handler_registry():
         dpg.add_mouse_move_handler(callback=mouse_move_handler)
-        dpg.add_mouse_down_handler(callback=mouse_down_handler)
         dpg.add_mouse_release_handler(callback=mouse_release_handler)
@@ -10,7 +10,7 @@ from repositories import images_repo as img_repo
 from repositories import movies_repo as mov_repo
 from transformations.data_models import LinRange
 from . import interface
-from models.image import Image, ImageTransformation, strip_extension, get_extension, ImageFormat, normalize, MAX_COLOR, \
+from models.image import Image, ImageTransformation, strip_extension, get_extension, ImageFormat, min_max_normalize, MAX_COLOR, \
     ImageChannelTransformation
 from frontend.interface_utils import render_error
 from transformations.sliding import PaddingStrategy
@@ -333,14 +333,14 @@ TR_NORMALIZE: str = 'normalize'
 def build_normalize_dialog(image_name: str) -> None:
     with build_tr_dialog(TR_NORMALIZE):
         build_tr_name_input(TR_NORMALIZE, image_name)
-        build_tr_dialog_end_buttons(TR_NORMALIZE, image_name, tr_normalize, generic_tr_inductive_handle(lambda img: (normalize(img.data, np.float64), [])))
+        build_tr_dialog_end_buttons(TR_NORMALIZE, image_name, tr_normalize, generic_tr_inductive_handle(lambda img: (min_max_normalize(img.data, np.float64), [])))
 
 def tr_normalize(image_name: str) -> Image:
     # 1. Obtenemos inputs
     image    = img_repo.get_image(image_name)
     new_name = get_tr_name_value(image)
     # 2. Procesamos
-    new_data = normalize(image.data, np.float64)
+    new_data = min_max_normalize(image.data, np.float64)
     # 3. Creamos Imagen
     return image.transform(new_name, new_data, ImageTransformation(TR_NORMALIZE, {}, {}))
 
@@ -743,6 +743,7 @@ TR_BORDER_PREWITT: str = 'prewitt'
 def build_border_prewitt_dialog(image_name: str) -> None:
     with build_tr_dialog(TR_BORDER_PREWITT):
         build_tr_name_input(TR_BORDER_PREWITT, image_name)
+        build_tr_checkbox('L1 Magnitude (|dx| + |dy|)')
         build_tr_radio_buttons(PaddingStrategy.names())
         build_tr_dialog_end_buttons(TR_BORDER_PREWITT, image_name, tr_border_prewitt, generic_tr_inductive_handle(border.prewitt))
 
@@ -751,16 +752,18 @@ def tr_border_prewitt(image_name: str) -> Image:
     image       = img_repo.get_image(image_name)
     new_name    = get_tr_name_value(image)
     padding_str = PaddingStrategy.from_str(get_tr_radio_buttons_value())
+    use_l1_magnitude = get_tr_checkbox_value()
     # 2. Procesamos
-    new_data, channels_tr = border.prewitt(image, padding_str)
+    new_data, channels_tr = border.prewitt(image, padding_str, use_l1_magnitude)
     # 3. Creamos Imagen
-    return image.transform(new_name, new_data, ImageTransformation(TR_BORDER_PREWITT, {}, {'padding_str': padding_str}, channels_tr))
+    return image.transform(new_name, new_data, ImageTransformation(TR_BORDER_PREWITT, {}, {'padding_str': padding_str, 'use_l1_magnitude': use_l1_magnitude}, channels_tr))
 
 TR_BORDER_SOBEL: str = 'sobel'
 @render_error
 def build_border_sobel_dialog(image_name: str) -> None:
     with build_tr_dialog(TR_BORDER_SOBEL):
         build_tr_name_input(TR_BORDER_SOBEL, image_name)
+        build_tr_checkbox('L1 Magnitude (|dx| + |dy|)')
         build_tr_radio_buttons(PaddingStrategy.names())
         build_tr_dialog_end_buttons(TR_BORDER_SOBEL, image_name, tr_border_sobel, generic_tr_inductive_handle(border.sobel))
 
@@ -769,10 +772,11 @@ def tr_border_sobel(image_name: str) -> Image:
     image       = img_repo.get_image(image_name)
     new_name    = get_tr_name_value(image)
     padding_str = PaddingStrategy.from_str(get_tr_radio_buttons_value())
+    use_l1_magnitude = get_tr_checkbox_value()
     # 2. Procesamos
-    new_data, channels_tr = border.sobel(image, padding_str)
+    new_data, channels_tr = border.sobel(image, padding_str, use_l1_magnitude)
     # 3. Creamos Imagen
-    return image.transform(new_name, new_data, ImageTransformation(TR_BORDER_SOBEL, {}, {'padding_str': padding_str}, channels_tr))
+    return image.transform(new_name, new_data, ImageTransformation(TR_BORDER_SOBEL, {}, {'padding_str': padding_str, 'use_l1_magnitude': use_l1_magnitude}, channels_tr))
 
 TR_BORDER_LAPLACIAN: str = 'laplacian'
 @render_error
@@ -23,6 +23,13 @@ RESERVED_IMAGE_NAMES: Tuple[str, ...] = (CIRCLE_IMAGE_NAME, SQUARE_IMAGE_NAME)
 # (hist, bins)
 Hist = Tuple[np.ndarray, np.ndarray]
 
+# Marca una funcion de canal que opera pixel a pixel (no mezcla canales ni depende de la forma del canal).
+# apply_over_channels la llama una unica vez con la imagen completa en vez de canal por canal.
+# La funcion debe retornar solo el ndarray, sin ImageChannelTransformation.
+def vectorized_over_channels(fn: Callable) -> Callable:
+    fn.vectorized_over_channels = True
+    return fn
+
 class ImageFormat(Enum):
     PGM     = 'pgm'
     PPM     = 'ppm'
@@ -43,11 +50,21 @@ class ImageFormat(Enum):
 
     @classmethod
     def from_extension(cls, ext):
-        return cls.from_str((ext[1:] if len(ext) > 0 and ext[0] == '.' else ext).lower())
+        fmt = _FORMATS_BY_EXTENSION.get(ext.lower())
+        if fmt is None:
+            # Formato invalido => from_str lanza el error
+            return cls.from_str((ext[1:] if len(ext) > 0 and ext[0] == '.' else ext).lower())
+        return fmt
 
     def to_extension(self) -> str:
         return '.' + self.value
 
+# Extension (con y sin punto) -> formato
+_FORMATS_BY_EXTENSION: Dict[str, ImageFormat] = {
+    **{fmt.value: fmt for fmt in ImageFormat},
+    **{fmt.to_extension(): fmt for fmt in ImageFormat},
+}
+
 @dataclass
 class ImageChannelTransformation:
     public_results:     Dict[str, Any]
@@ -123,13 +140,19 @@ class Image:
         x, y = pixel
         return 0 <= x < self.width and 0 <= y < self.height
 
-    def get_pixel(self, pixel: Tuple[int, int]) -> bool:
+    # Un unico indexado con tupla => Numpy va directo al elemento, sin crear la vista de la fila
+    def get_pixel(self, pixel: Tuple[int, int]) -> Union[np.generic, np.ndarray]:
         x, y = pixel
         return self.data[y, x]
 
     def get_channel(self, channel: int) -> np.ndarray:
         return self.data[:, :, channel] if self.channels > 1 else self.data
 
+    # Un canal de la imagen intercalada no es contiguo => Transponemos una unica vez (channel x height x width), y cada canal pasa a ser contiguo.
+    # Es una copia completa de la imagen => Solo vive mientras dura la operacion sobre los canales.
+    def _contiguous_channels(self) -> np.ndarray:
+        return np.ascontiguousarray(np.moveaxis(self.data, -1, 0))
+
     def apply_over_channels(self, fn: Callable[[np.ndarray, Any], Union[np.ndarray, Tuple[np.ndarray, ImageChannelTransformation]]], *args, **kwargs) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
         new_data: np.ndarray
         channels_tr: List[ImageChannelTransformation] = []
@@ -141,10 +164,24 @@ class Image:
                 channels_tr.append(fn_ret[1])
             else:
                 new_data = fn_ret
+        elif getattr(fn, 'vectorized_over_channels', False):
+            new_data = fn(self.data, *args, **kwargs)
         else:
-            new_data = np.empty(self.shape)
-            for channel in range(self.channels):
-                fn_ret = fn(self.get_channel(channel), *args, **kwargs)
+            data0: np.ndarray
+            channels = self._contiguous_channels()
+            # Primera iteracion para obtener shape y tipo del resultado
+            fn_ret = fn(channels[0], *args, **kwargs)
+            if isinstance(fn_ret, tuple):
+                data0 = fn_ret[0]
+                channels_tr.append(fn_ret[1])
+            else:
+                data0 = fn_ret
+
+            new_data = np.empty((*data0.shape, self.channels), dtype=data0.dtype)
+            new_data[:, :, 0] = data0
+
+            for channel in range(1, self.channels):
+                fn_ret = fn(channels[channel], *args, **kwargs)
                 if isinstance(fn_ret, tuple):
                     new_data[:, :, channel] = fn_ret[0]
                     channels_tr.append(fn_ret[1])
@@ -168,20 +205,22 @@ class Image:
             else:
                 new_data = fn_ret
         else:
-            data0: np.ndarrray
-            # Primera iteracion para obtener shape
-            fn_ret = fn(self.get_channel(0), other.get_channel(0), *args, **kwargs)
+            data0: np.ndarray
+            channels = self._contiguous_channels()
+            other_channels = other._contiguous_channels()
+            # Primera iteracion para obtener shape y tipo del resultado
+            fn_ret = fn(channels[0], other_channels[0], *args, **kwargs)
             if isinstance(fn_ret, tuple):
                 data0 = fn_ret[0]
                 channels_tr.append(fn_ret[1])
             else:
                 data0 = fn_ret
 
-            new_data = np.empty((*data0.shape, 3))
+            new_data = np.empty((*data0.shape, self.channels), dtype=data0.dtype)
             new_data[:, :, 0] = data0
 
             for channel in range(1, self.channels):
-                fn_ret = fn(self.get_channel(channel), other.get_channel(channel), *args, **kwargs)
+                fn_ret = fn(channels[channel], other_channels[channel], *args, **kwargs)
                 if isinstance(fn_ret, tuple):
                     new_data[:, :, channel] = fn_ret[0]
                     channels_tr.append(fn_ret[1])
@@ -200,6 +239,10 @@ class Image:
                 channel_histogram(self.get_channel(Image.BLUE_CHANNEL))
             )
 
+    # Las imagenes se guardan en uint8. Las transformaciones que necesitan operar en punto flotante piden una copia explicitamente.
+    def as_float(self) -> np.ndarray:
+        return self.data.astype(np.float64, copy=True)
+
     def transform(self, new_name: str, new_data: np.ndarray, transformation: ImageTransformation):
         return Image(new_name, self.format, new_data, movie=self.movie, transformations=self.transformations + [transformation])
 
@@ -268,21 +311,37 @@ def valid_image_formats() -> Iterable[str]:
     formats = list(map(lambda fmt: fmt.to_extension(), ImageFormat))
     return itertools.chain(formats, map(lambda f: f.upper(), formats))
 
+# Dearpygui acepta texturas float32, no hace falta usar float64
+_RGBA_SCALE = np.float32(1 / MAX_COLOR)
+
+# Empaqueta height x width x (1 o 3) canales en un unico buffer RGBA preescalado.
+# Escribimos directo sobre el buffer final: no se desplaza la data como con np.insert, y el alpha se escribe una sola vez.
+def _pack_rgba(data: np.ndarray) -> np.ndarray:
+    out = np.empty((*data.shape[:2], 4), dtype=np.float32)
+    np.multiply(data, _RGBA_SCALE, out=out[..., :3])
+    out[..., 3] = 1
+    return out.reshape(-1)
+
 def _grayscale_to_rgba(data: np.ndarray) -> np.ndarray:
-    # Tenemos que repetir el valor por cada canal de color, y agregar 1 por el canal del alpha
-    return _color_to_rgba(np.repeat(data.reshape((*data.shape, 1)), 3, axis=2))
+    # Tenemos que repetir el valor por cada canal de color.
+    # broadcast_to es una vista con stride 0 en el canal => Se repite al escribir, sin materializar una copia HxWx3.
+    return _pack_rgba(np.broadcast_to(data[..., None], (*data.shape, 3)))
 
 def _color_to_rgba(data: np.ndarray) -> np.ndarray:
     # Solamente hace falta agregar el canal del alpha (que siempre es 1)
-    return np.insert(data, 3, 255, axis=2).flatten() / 255
+    return _pack_rgba(data)
 
 def image_to_rgba_array(image: Image) -> np.ndarray:
-    normalized_data = normalize(image.data)
+    # Se muestra con el contraste estirado, incluso si la imagen es uint8
+    normalized_data = min_max_normalize(image.data)
     if image.channels == 1:
         return _grayscale_to_rgba(normalized_data)
     elif image.channels == 3:
         return _color_to_rgba(normalized_data)
 
+# Modos de PIL cuyos pixeles son uint8 por banda
+_UINT8_PIL_MODES: Tuple[str, ...] = ('L', 'RGB', 'RGBA')
+
 # height x width x channel
 def load_image(path: str, movie: Optional[str] = None) -> Image:
     name = Image.name_from_path(path)
@@ -293,52 +352,74 @@ def load_image(path: str, movie: Optional[str] = None) -> Image:
         data = np.fromfile(path, dtype=np.uint8)
         data = data.reshape((metadata.height, metadata.width))
     else:
-        data = np.asarray(PImage.open(path), dtype=np.uint8) # noqa
+        with PImage.open(path) as pim:
+            pim.load()
+            if pim.mode in _UINT8_PIL_MODES:
+                # Ya esta en uint8 => Usamos directo los bytes decodificados, sin la conversion de np.asarray
+                shape = (pim.height, pim.width) if pim.mode == 'L' else (pim.height, pim.width, len(pim.getbands()))
+                data = np.frombuffer(pim.tobytes(), dtype=np.uint8).reshape(shape)
+            else:
+                data = np.asarray(pim, dtype=np.uint8) # noqa
 
-    return Image(name, fmt, data.astype(np.float64), movie=movie)
+    return Image(name, fmt, data, movie=movie)
 
 def save_image(image: Image, dir_path: str) -> None:
-    normalized_data = normalize(image.data)
+    # Las imagenes sin transformar ya estan en uint8 contiguo => Se escriben directamente
+    if image.data.dtype == np.uint8 and image.data.flags.c_contiguous:
+        normalized_data = image.data
+    else:
+        normalized_data = normalize(image.data)
     path = os.path.join(dir_path, strip_extension(image.name)) + image.format.to_extension()
     if image.format == ImageFormat.RAW:
         # Write bytes from data
-        with open(path, 'wb') as fp:
-            for b in normalized_data.flatten():
-                fp.write(b)
+        normalized_data.tofile(path)
         # Write metadata
         metadata_repo.persist_image_metadata(image.name, image.width, image.height)
     else:
         PImage.fromarray(normalized_data).save(path)
 
-# Normalizes to uint8 ndarray
+# Normalizes to uint8 ndarray. Always C-contiguous, so it can be handed directly to a buffer.
 def normalize(data: np.ndarray, as_type=np.uint8) -> np.ndarray:
     if data.dtype == np.uint8:
-        return data.astype(as_type, copy=False)
+        return np.ascontiguousarray(data.astype(as_type, copy=False))
     elif np.can_cast(data.dtype, np.uint8, casting='safe'):
-        return data.astype(as_type, copy=False)
+        return np.ascontiguousarray(data.astype(as_type, copy=False))
     else:
-        amax = data.max()
-        amin = data.min()
-        if amax - amin == 0:
-            return np.full(data.shape, min(abs(int(data[0, 0])), 255))
-        else:
-            ret = (data - amin) / (amax - amin) * 255
-            return ret.astype(as_type, copy=False)
+        return min_max_normalize(data, as_type)
+
+# Estira el rango de valores a [0, 255] sin importar el tipo. A diferencia de normalize, tambien estira las imagenes uint8.
+def min_max_normalize(data: np.ndarray, as_type=np.uint8) -> np.ndarray:
+    amax = data.max()
+    amin = data.min()
+    if amax - amin == 0:
+        return np.full(data.shape, min(abs(int(data[0, 0])), 255))
+    else:
+        # Un unico buffer temporal de punto flotante, operado in place, y la escala escribe directo en el tipo destino
+        ret = np.subtract(data, amin, dtype=data.dtype if np.issubdtype(data.dtype, np.floating) else np.float64)
+        ret /= amax - amin
+        out = ret if np.dtype(as_type) == ret.dtype else np.empty(data.shape, dtype=as_type)
+        return np.multiply(ret, 255, out=out, casting='unsafe')
 
 def channel_histogram(channel: np.ndarray) -> Hist:
-    channel = normalize(channel, np.float64)
-    hist, bins = np.histogram(channel.flatten(), bins=COLOR_DEPTH, range=(0, COLOR_DEPTH))
-    return hist / channel.size, bins
+    # Si ya esta en uint8 no hace falta normalizar (ni copiar). np.histogram acepta la matriz directamente.
+    if channel.dtype != np.uint8:
+        channel = normalize(channel)
+    hist, bins = np.histogram(channel, bins=COLOR_DEPTH, range=(0, COLOR_DEPTH))
+    # Mantenemos float64, ya que Otsu opera sobre sumas acumuladas del histograma
+    return hist * (1 / channel.size), bins
 
 # ***************************** Default Images ******************************** #
 
 CREATED_IMAGE_LEN: int = 200
 CIRCLE_RADIUS: int = 100
-def create_circle_image() -> Image:
+def _build_circle_data() -> np.ndarray:
     mask = create_circular_mask(CREATED_IMAGE_LEN, CREATED_IMAGE_LEN, radius=CIRCLE_RADIUS)
-    data = np.zeros((CREATED_IMAGE_LEN, CREATED_IMAGE_LEN), dtype=np.float64)
+    data = np.zeros((CREATED_IMAGE_LEN, CREATED_IMAGE_LEN), dtype=np.uint8)
     data[mask] = 255
-    return Image(CIRCLE_IMAGE_NAME, ImageFormat.PGM, data, allow_reserved=True)
+    return data
+
+def create_circle_image() -> Image:
+    return Image(CIRCLE_IMAGE_NAME, ImageFormat.PGM, _CIRCLE_DATA.copy(), allow_reserved=True)
 
 # https://stackoverflow.com/a/44874588
 def create_circular_mask(h, w, center=None, radius=None):
@@ -348,18 +429,25 @@ def create_circular_mask(h, w, center=None, radius=None):
         radius = min(center[0], center[1], w-center[0], h-center[1])
 
     y, x = np.ogrid[:h, :w]
-    dist_from_center = np.sqrt((x - center[0])**2 + (y-center[1])**2)
+    # Comparamos contra el radio al cuadrado para evitar la raiz. Gracias a ogrid, los cuadrados se calculan por fila y columna, no por pixel.
+    sq_dist_from_center = (x - center[0])**2 + (y - center[1])**2
 
-    mask = dist_from_center <= radius
+    mask = sq_dist_from_center <= radius * radius
     return mask
 
 
 SQUARE_LEN: int = 160
-def create_square_image() -> Image:
+def _build_square_data() -> np.ndarray:
     diff = (CREATED_IMAGE_LEN - SQUARE_LEN) // 2
     min_square = diff
     max_square = CREATED_IMAGE_LEN - diff
-    data = np.zeros((CREATED_IMAGE_LEN, CREATED_IMAGE_LEN), dtype=np.float64)
+    data = np.zeros((CREATED_IMAGE_LEN, CREATED_IMAGE_LEN), dtype=np.uint8)
     data[min_square:max_square, min_square:max_square] = 255
+    return data
+
+def create_square_image() -> Image:
+    return Image(SQUARE_IMAGE_NAME, ImageFormat.PGM, _SQUARE_DATA.copy(), allow_reserved=True)
 
-    return Image(SQUARE_IMAGE_NAME, ImageFormat.PGM, data, allow_reserved=True)
+# Las imagenes por defecto son constantes => Las calculamos una unica vez, y create_*_image entrega copias para protegerlas
+_CIRCLE_DATA: np.ndarray = _build_circle_data()
+_SQUARE_DATA: np.ndarray = _build_square_data()
@@ -1,23 +1,33 @@
+import functools
 import os
 from typing import Dict
 
+# Las funciones de paths son puras y se llaman repetidamente con los mismos nombres (ej: frames de un movie) => Las cacheamos
 
+@functools.lru_cache(maxsize=4096)
 def get_extension(path: str) -> str:
     return os.path.splitext(path)[1]
 
+@functools.lru_cache(maxsize=4096)
 def strip_extension(path: str) -> str:
     return os.path.splitext(path)[0]
 
+@functools.lru_cache(maxsize=4096)
 def append_to_filename(filename: str, s: str) -> str:
     split = os.path.splitext(filename)
     return split[0] + s + split[1]
 
+@functools.lru_cache(maxsize=4096)
 def lower_extension(path: str) -> str:
     split_name = os.path.splitext(os.path.basename(path))
     return split_name[0] + split_name[1].lower()
 
 def movie_dir_selections(movie_dir: str) -> Dict[str, str]:
-    frames = next(os.walk(movie_dir), (None, None, []))[2]
-    return {frame: os.path.join(movie_dir, frame) for frame in frames}
+    # scandir ya trae el tipo de cada entrada => No hace falta un stat por archivo como en os.walk
+    try:
+        with os.scandir(movie_dir) as entries:
+            return {entry.name: os.path.join(movie_dir, entry.name) for entry in entries if entry.is_file()}
+    except OSError:
+        return {}  # Mismo comportamiento que os.walk ante un directorio invalido
 
 
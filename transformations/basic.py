@@ -4,7 +4,8 @@ import numpy as np
 from models.image import Image, MAX_COLOR, ImageChannelTransformation, normalize, channel_histogram
 
 def channel_equalization(channel: np.ndarray) -> np.ndarray:
-    channel = normalize(channel, np.int64)
+    # El histograma y la busqueda en s deben usar los mismos valores => Ambos sobre el canal en uint8
+    channel = normalize(channel)
     normed_hist, bins = channel_histogram(channel)
     s = normed_hist.cumsum()
     masked_s = np.ma.masked_equal(s, 0)
@@ -5,17 +5,20 @@ from typing import List, Optional, Tuple, Union
 from xmlrpc.client import Boolean
 
 import numpy as np
+from numba import njit, prange
 from models.draw_cmd import CircleDrawCmd, DrawCmd, LineDrawCmd, ScatterDrawCmd
 from models.image import MAX_COLOR, Image, ImageChannelTransformation, normalize
 from transformations.data_models import Measurement
 from transformations.denoise import gauss_channel
 
-from transformations.np_utils import gauss_kernel, index_matrix
+from transformations.np_utils import gauss_kernel
 from .data_models import ActiveOutlineMetrics, LinRange
-from .sliding import PaddingStrategy, sliding_window, weighted_sum
+from .sliding import PaddingStrategy, weighted_sum, weighted_sums
 
 RHO_RESOLUTION = 125
 THETA_RESOLUTION = 91
+# Cantidad maxima de elementos de los tensores temporales de Hough. Los puntos blancos se procesan en bloques para no superarla.
+HOUGH_BLOCK_ELEMENTS = 1 << 20
 
 class Direction(Enum):
     VERTICAL = [
@@ -67,6 +70,19 @@ class Direction(Enum):
     def kernel(self) -> np.ndarray:
         return np.array(self.value)
 
+    # Cantidad de pasos de 45 grados (en sentido horario) para llevar un kernel vertical a esta direccion.
+    # En un kernel de 3x3 cada paso equivale a rotar una posicion el anillo exterior.
+    @property
+    def ring_shift(self) -> int:
+        if self == Direction.VERTICAL:
+            return 0
+        elif self == Direction.POSITIVE_DIAGONAL:
+            return 1
+        elif self == Direction.HORIZONTAL:
+            return 2
+        else:
+            return 3
+
     # https://stackoverflow.com/a/41506120/12270520
     @staticmethod
     def _outer_slice(x):
@@ -82,8 +98,17 @@ class Direction(Enum):
             out.ravel()[sliced_idx] = np.roll(np.take(x, sliced_idx), shift)
         return out
 
-    def align_vertical_kernel(self, kernel: np.ndarray):
-        return self._rotate_matrix(kernel, self.value)
+    def align_vertical_kernel(self, kernel: np.ndarray) -> np.ndarray:
+        # Las combinaciones de direccion y kernel son pocas y siempre las mismas => Cacheamos la rotacion
+        return aligned_vertical_kernel(self, kernel.tobytes(), kernel.shape, kernel.dtype.str)
+
+# Los arrays no son hasheables => El kernel se identifica por sus bytes, forma y tipo
+@functools.lru_cache(maxsize=64)
+def aligned_vertical_kernel(direction: Direction, kernel_bytes: bytes, shape: Tuple[int, ...], dtype: str) -> np.ndarray:
+    kernel = np.frombuffer(kernel_bytes, dtype=dtype).reshape(shape)
+    aligned = Direction._rotate_matrix(kernel, direction.ring_shift)
+    aligned.flags.writeable = False
+    return aligned
 
 class FamousKernel(Enum):
     # x derivative kernel
@@ -121,9 +146,29 @@ class FamousKernel(Enum):
     def kernel(self) -> np.ndarray:
         return np.array(self.value)
 
+# (ix2 * iy2 - ixy^2) - k * (ix2 + iy2)^power, reutilizando un unico buffer temporal
+def calculate_r(ix2: np.ndarray, ixy: np.ndarray, iy2: np.ndarray, k: float, power: int) -> np.ndarray:
+    r = np.multiply(ix2, iy2)
+    tmp = np.multiply(ixy, ixy)
+    r -= tmp
+
+    np.add(ix2, iy2, out=tmp)
+    np.power(tmp, power, out=tmp)
+    tmp *= k
+    r -= tmp
+
+    return r
+
+def calculate_r1(ix2: np.ndarray, ixy: np.ndarray, iy2: np.ndarray, k: float) -> np.ndarray:
+    return calculate_r(ix2, ixy, iy2, k, 2)
+
+def calculate_r2(ix2: np.ndarray, ixy: np.ndarray, iy2: np.ndarray, k: float) -> np.ndarray:
+    return calculate_r(ix2, ixy, iy2, k, 4)
+
+# Las funciones se envuelven en partial para que Enum no las tome como metodos
 class HarrisR(Enum):
-    R1  = functools.partial(lambda ix2, ixy, iy2, k: (ix2 * iy2 - ixy ** 2) - k * (ix2 + iy2) ** 2)
-    R2  = functools.partial(lambda ix2, ixy, iy2, k: (ix2 * iy2 - ixy ** 2) - k * (ix2 + iy2) ** 4)
+    R1  = functools.partial(calculate_r1)
+    R2  = functools.partial(calculate_r2)
 
     def __call__(self, *args, **kwargs) -> np.ndarray:
         return self.value(*args, **kwargs)
@@ -148,45 +193,66 @@ def high_pass_channel(channel: np.ndarray, kernel_size: int, padding_str: Paddin
     kernel[kernel_size // 2, kernel_size // 2] = (kernel_size ** 2 - 1) / kernel_size
     return weighted_sum(channel, kernel, padding_str)
 
+# Derivadas en x e y. El kernel de y es el de x rotado, y ambos comparten la misma sliding window.
+def gradients(img: np.ndarray, kernel: np.ndarray, padding_str: PaddingStrategy) -> Tuple[np.ndarray, np.ndarray]:
+    return weighted_sums(img, (kernel, np.rot90(kernel, k=-1)), padding_str)
+
 def gradient_modulus(img: np.ndarray, kernel: np.ndarray, padding_str: PaddingStrategy) -> np.ndarray:
-    x_channel = weighted_sum(img, kernel, padding_str)
-    kernel = np.rot90(kernel, k=-1)
-    y_channel = weighted_sum(img, kernel, padding_str)
-    return np.sqrt(y_channel ** 2 + x_channel ** 2)
+    x_channel, y_channel = gradients(img, kernel, padding_str)
+    return np.hypot(y_channel, x_channel)
+
+# Modulo aproximado |dx| + |dy| para kernels de la forma de Prewitt/Sobel: [-1, 0, 1] con peso center_weight en el centro.
+# dx y dy solo dependen de las columnas y filas extremas de la ventana => Cada suma parcial se calcula una unica vez.
+@njit(cache=True, parallel=True)
+def l1_gradient_modulus_padded(padded: np.ndarray, center_weight: float) -> np.ndarray:
+    rows = padded.shape[0] - 2
+    cols = padded.shape[1] - 2
+    ret = np.empty((rows, cols))
+    for row in prange(rows):
+        for col in range(cols):
+            left    = padded[row, col]      + center_weight * padded[row + 1, col]      + padded[row + 2, col]
+            right   = padded[row, col + 2]  + center_weight * padded[row + 1, col + 2]  + padded[row + 2, col + 2]
+            top     = padded[row, col]      + center_weight * padded[row, col + 1]      + padded[row, col + 2]
+            bottom  = padded[row + 2, col]  + center_weight * padded[row + 2, col + 1]  + padded[row + 2, col + 2]
+            ret[row, col] = abs(right - left) + abs(bottom - top)
+    return ret
 
-def prewitt_channel(channel: np.ndarray, padding_str: PaddingStrategy) -> np.ndarray:
+def l1_gradient_modulus(channel: np.ndarray, center_weight: float, padding_str: PaddingStrategy) -> np.ndarray:
+    # Operamos en punto flotante para que las restas no desborden en uint8
+    padded = padding_str.pad(channel.astype(np.float64, copy=False), (3, 3))
+    return l1_gradient_modulus_padded(padded, center_weight)
+
+def prewitt_channel(channel: np.ndarray, padding_str: PaddingStrategy, use_l1_magnitude: bool = False) -> np.ndarray:
+    if use_l1_magnitude:
+        return l1_gradient_modulus(channel, 1, padding_str)
     return gradient_modulus(channel, FamousKernel.PREWITT.kernel, padding_str)
 
-def sobel_channel(channel: np.ndarray, padding_str: PaddingStrategy) -> np.ndarray:
+def sobel_channel(channel: np.ndarray, padding_str: PaddingStrategy, use_l1_magnitude: bool = False) -> np.ndarray:
+    if use_l1_magnitude:
+        return l1_gradient_modulus(channel, 2, padding_str)
     return gradient_modulus(channel, FamousKernel.SOBEL.kernel, padding_str)
 
-def zero_crossing_vertical(data: np.ndarray, threshold: int) -> np.ndarray:
-    ans = np.empty(data.shape, dtype=np.bool8)
-    # Cambios de signo directos
-    ans[:-1] = (data[:-1] * data[1:] < 0) & (np.abs(data[:-1] - data[1:]) > threshold)
-    # Cambios con un 0 en el medio
-    ans[:-2] |= (data[:-2] * data[2:] < 0) & (data[1:-1] == 0) & (np.abs(data[:-2] - data[2:]) > threshold)
-    # Ultimo nunca cruza
-    ans[-1] = False
-
-    return ans
-
-def zero_crossing_horizontal(data: np.ndarray, threshold: int) -> np.ndarray:
-    ans = np.empty(data.shape, dtype=np.bool8)
+# Cruces por cero a lo largo del primer eje. Para el otro eje se llama con las matrices transpuestas (vistas, sin copia).
+# Recibe los signos ya calculados, para compartirlos entre ambos ejes.
+def zero_crossing_axis(data: np.ndarray, positive: np.ndarray, negative: np.ndarray, threshold: int) -> np.ndarray:
+    ans = np.zeros(data.shape, dtype=bool)
     # Cambios de signo directos
-    ans[:, :-1] = (data[:, :-1] * data[:, 1:] < 0) & (np.abs(data[:, :-1] - data[:, 1:]) > threshold)
+    ans[:-1] = ((positive[:-1] & negative[1:]) | (negative[:-1] & positive[1:])) & (np.abs(data[:-1] - data[1:]) > threshold)
     # Cambios con un 0 en el medio
-    ans[:, :-2] |= (data[:, :-2] * data[:, 2:] < 0) & (data[:, 1:-1] == 0) & (np.abs(data[:, :-2] - data[:, 2:]) > threshold)
-    # Ultimo nunca cruza
-    ans[:, -1] = False
+    zero = ~(positive[1:-1] | negative[1:-1])
+    ans[:-2] |= ((positive[:-2] & negative[2:]) | (negative[:-2] & positive[2:])) & zero & (np.abs(data[:-2] - data[2:]) > threshold)
+    # Ultimo nunca cruza (ya es False)
 
     return ans
 
 def zero_crossing_borders(data: np.ndarray, threshold: int) -> np.ndarray:
-    mask = zero_crossing_vertical(data, threshold) | zero_crossing_horizontal(data, threshold)
-    ret = np.zeros(data.shape)
-    ret[mask] = MAX_COLOR
-    return ret
+    # Los signos se calculan una unica vez para ambas direcciones
+    positive = data > 0
+    negative = data < 0
+    mask = zero_crossing_axis(data, positive, negative, threshold)
+    mask |= zero_crossing_axis(data.T, positive.T, negative.T, threshold).T
+    # Pasamos la mascara a color en una unica pasada: True => MAX_COLOR, False => 0
+    return np.multiply(mask, MAX_COLOR, dtype=np.float64)
 
 def laplacian_channel(channel: np.ndarray, crossing_threshold: int, padding_str: PaddingStrategy) -> np.ndarray:
     # Derivada segunda
@@ -195,13 +261,17 @@ def laplacian_channel(channel: np.ndarray, crossing_threshold: int, padding_str:
     # Queremos ver donde se hace 0, pues son los minimos/maximos de la derivada => borde
     return zero_crossing_borders(channel, crossing_threshold)
 
+# El kernel solo depende de sigma => Lo cacheamos
+@functools.lru_cache(maxsize=32)
 def log_kernel(sigma: float) -> np.ndarray:
     kernel_size = int(sigma * 10 + 1)
-    indices = np.array(list(np.ndindex((kernel_size, kernel_size)))) - kernel_size//2 # noqa
-    indices = np.reshape(indices, (kernel_size, kernel_size, 2))
-    sum_squared_over_sigma = np.sum(indices**2, axis=2) / sigma**2  # (x^2 + y^2) / sigma^2
+    offset = kernel_size // 2
+    y, x = np.ogrid[-offset:kernel_size - offset, -offset:kernel_size - offset]
+    sum_squared_over_sigma = (y**2 + x**2) / sigma**2               # (x^2 + y^2) / sigma^2
     k = (np.sqrt(2 * np.pi) * sigma**3)                             # sqrt(2pi) * sigma^3
-    return - ((2 - sum_squared_over_sigma) / k) * np.exp(-sum_squared_over_sigma/2)
+    kernel = - ((2 - sum_squared_over_sigma) / k) * np.exp(-sum_squared_over_sigma/2)
+    kernel.flags.writeable = False
+    return kernel
 
 def log_channel(channel: np.ndarray, sigma: float, crossing_threshold: int, padding_str: PaddingStrategy) -> np.ndarray:
     # Derivada segunda con gauss
@@ -210,64 +280,81 @@ def log_channel(channel: np.ndarray, sigma: float, crossing_threshold: int, padd
     # Queremos ver donde se hace 0, pues son los minimos/maximos de la derivada => borde
     return zero_crossing_borders(channel, crossing_threshold)
 
+# Recorre cada pixel contando los vecinos similares al centro, sin materializar la sliding window.
+# Como en la version con sliding window, los pixeles fuera del circulo valen 0 => son similares si el centro es oscuro.
+@njit(cache=True, parallel=True)
+def susan_padded(padded: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    k_rows, k_cols = kernel.shape
+    rows = padded.shape[0] - k_rows + 1
+    cols = padded.shape[1] - k_cols + 1
+    ret = np.empty((rows, cols))
+    for row in prange(rows):
+        for col in range(cols):
+            center = padded[row + k_rows // 2, col + k_cols // 2]
+            similar = 0
+            for k_row in range(k_rows):
+                for k_col in range(k_cols):
+                    if abs(padded[row + k_row, col + k_col] * kernel[k_row, k_col] - center) < 15:
+                        similar += 1
+
+            # Clasificamos: 63 => borde, 255 => esquina, el resto 0
+            value = 1 - similar / kernel.size
+            if 0.4 <= value < 0.65:
+                ret[row, col] = 63
+            elif 0.65 <= value < 0.85:
+                ret[row, col] = 255
+            else:
+                ret[row, col] = 0
+    return ret
+
 def susan_channel(channel: np.ndarray, padding_str: PaddingStrategy) -> np.ndarray:
     kernel = FamousKernel.SUSAN.kernel
-    sw = sliding_window(channel, np.shape(kernel), padding_str)
-
-    # Expando dimensiones para que sea compatible con el tamaño de la sliding window
-    new_channel = np.expand_dims(channel, axis=(2,3))
-    absolute_values = np.absolute(sw[:,:]*kernel - new_channel[:,:])
-    absolute_values[absolute_values < 15] = 1
-    absolute_values[absolute_values >= 15] = 0
-
-    values = 1 - np.sum(absolute_values, axis=(2, 3)) / kernel.size
-    values[(values < 0.4) | (values >= 0.85)] = 0
-    values[(values >= 0.4) & (values < 0.65)] = 63
-    values[(values >= 0.65) & (values < 0.85)] = 255
-
-    return values
+    # |vecino - centro| se calcula dentro de susan_padded, sobre el padding => El padding ya tiene que ser float64
+    padded = padding_str.pad(channel.astype(np.float64, copy=False), kernel.shape)
+    return susan_padded(padded, kernel.astype(np.float64))
 
 def hough_lines_channel(channel: np.ndarray, theta: np.ndarray, rho: np.ndarray, threshold: float, most_fitted_ratio: float) -> Tuple[np.ndarray, ImageChannelTransformation]:
-    indices = np.insert(index_matrix(*channel.shape), 0, -1, axis=2)
-    acum = np.empty((rho.size, theta.size))
-    white_points = channel > 0
-
-    for i in range(len(rho)):
-        for j in range(len(theta)):
-            params = np.hstack((rho[i], np.sin(theta[j]),  np.cos(theta[j])))
-            # |rho - y*sin(theta) - x*cos(theta)|
-            line = np.abs(np.sum(params * indices, axis=2)) < threshold
-            acum[i, j] = np.sum(white_points & line)
-
-    most_fitted_lines = np.argwhere(acum > most_fitted_ratio * acum.max())
-    Y = np.transpose(most_fitted_lines)[0]
-    X = np.transpose(most_fitted_lines)[1]
-
-    best = np.hstack((rho[Y, None], theta[X, None]))
+    # Solo los puntos blancos pueden votar => Operamos unicamente sobre ellos
+    ys, xs = np.nonzero(channel > 0)
+    rho_col = rho[:, None, None]
+    sin = np.sin(theta)[None, :, None]
+    cos = np.cos(theta)[None, :, None]
+    acum = np.zeros((rho.size, theta.size), dtype=np.int64)
+
+    block_size = max(1, HOUGH_BLOCK_ELEMENTS // acum.size)
+    for start in range(0, len(ys), block_size):
+        y = ys[start:start + block_size][None, None, :]
+        x = xs[start:start + block_size][None, None, :]
+        # |rho - y*sin(theta) - x*cos(theta)|
+        line = np.abs(y * sin - rho_col + x * cos) < threshold
+        acum += np.count_nonzero(line, axis=2)
+
+    Y, X = np.nonzero(acum > most_fitted_ratio * acum.max())
+    best = np.column_stack((rho[Y], theta[X]))
 
     lines = list(filter(lambda l: l, (get_border_points(rho, theta, channel.shape) for rho, theta in best)))
     
     return channel, ImageChannelTransformation({'best': best}, {}, lines)
 
 def hough_circle_channel(channel: np.ndarray, radius: np.ndarray, x_axis: np.ndarray, y_axis: np.ndarray, threshold: float, most_fitted_ratio: float) -> Tuple[np.ndarray, ImageChannelTransformation]:
-    indices = index_matrix(*channel.shape)
     centers = np.stack(np.meshgrid(y_axis, x_axis), -1).reshape((-1, 2))
-    acum = np.empty((radius.size, len(centers)))
-    white_points = channel > 0
-
-    for i in range(len(radius)):
-        for j in range(len(centers)):
+    ys, xs = np.nonzero(channel > 0)
+    center_y = centers[:, 0, None]
+    center_x = centers[:, 1, None]
+    acum = np.zeros((radius.size, len(centers)), dtype=np.int64)
+
+    block_size = max(1, HOUGH_BLOCK_ELEMENTS // len(centers))
+    for start in range(0, len(ys), block_size):
+        # Las distancias a cada centro no dependen del radio => Se calculan una vez por bloque
+        dist_y = (ys[None, start:start + block_size] - center_y) ** 2
+        dist_x = (xs[None, start:start + block_size] - center_x) ** 2
+        for i in range(len(radius)):
             # |rho - (y - b)^2 - (x - a)^2|
-            circles = (indices - centers[j]) ** 2
-            circles = np.insert(circles, 0, - radius[i] ** 2, axis=2)
-            circles = np.abs(np.sum(circles, axis=2)) < threshold
-            acum[i, j] = np.sum(white_points & circles)
-
-    most_fitted_lines = np.argwhere(acum > most_fitted_ratio * acum.max())
-    Y = np.transpose(most_fitted_lines)[0]
-    X = np.transpose(most_fitted_lines)[1]
+            circles = np.abs(dist_y - radius[i] ** 2 + dist_x) < threshold
+            acum[i] += np.count_nonzero(circles, axis=1)
 
-    best = np.hstack((radius[Y, None], centers[X]))
+    Y, X = np.nonzero(acum > most_fitted_ratio * acum.max())
+    best = np.column_stack((radius[Y], centers[X]))
 
     overlay = list(filter(lambda l: l, (CircleDrawCmd(r, y, x) for r, y, x in best)))
 
@@ -297,20 +384,43 @@ def get_border_points(rho: float, theta: float, img_shape) -> Optional[LineDrawC
         
     return LineDrawCmd(*ans[0], *ans[1])
 
+@njit(cache=True)
 def canny_drag_borders(gradient_mod: np.ndarray, t1: int, t2: int, max_col: int, max_row: int, row: int, col: int) -> None:
     if t1 < gradient_mod[row, col] < t2:
         # Conectado por un borde de manera 8-conexo
-        neighbour = gradient_mod[max(row - 1, 0):min(row + 2, max_row), max(col - 1, 0):min(col + 2, max_col)]
-        gradient_mod[row, col] = MAX_COLOR if np.amax(neighbour) == MAX_COLOR else 0
+        connected = False
+        for n_row in range(max(row - 1, 0), min(row + 2, max_row)):
+            for n_col in range(max(col - 1, 0), min(col + 2, max_col)):
+                if gradient_mod[n_row, n_col] == MAX_COLOR:
+                    connected = True
+        gradient_mod[row, col] = MAX_COLOR if connected else 0
+
+# Compilado con numba: el arrastre es secuencial (cada pixel depende de los ya procesados), asi que no se puede vectorizar
+@njit(cache=True)
+def canny_hysteresis(gradient_mod: np.ndarray, t1: int, t2: int) -> None:
+    max_row, max_col = gradient_mod.shape
+
+    # Arrastramos los bordes de manera vertical
+    for row in range(max_row):
+        for col in range(max_col):
+            canny_drag_borders(gradient_mod, t1, t2, max_col, max_row, row, col)
+
+    # Arrastramos los bordes de manera horizontal
+    for col in range(max_col):
+        for row in range(max_row):
+            canny_drag_borders(gradient_mod, t1, t2, max_col, max_row, row, col)
+
+# Limites de la discretizacion del angulo de Canny, y posiciones (relativas al centro) que marca el kernel
+# de cada direccion discretizada: 0, 45, 90 y 135 grados
+CANNY_ANGLE_BINS = np.array([22.5, 67.5, 112.5, 157.5])
+CANNY_DIRECTION_OFFSETS = np.stack([np.argwhere(Direction.from_angle(angle).kernel) - 1 for angle in (0, 45, 90, 135)])
 
 # Asume que ya fue paso por un filtro gaussiano
 def canny_channel(channel: np.ndarray, t1: int, t2: int, padding_str: PaddingStrategy) -> np.ndarray:
     # Usamos prewitt para derivar
     kernel = FamousKernel.PREWITT.kernel
-    dx = weighted_sum(channel, kernel, padding_str)
-    kernel = np.rot90(kernel, k=-1)
-    dy = weighted_sum(channel, kernel, padding_str)
-    gradient_mod = np.sqrt(dy ** 2 + dx ** 2)
+    dx, dy = gradients(channel, kernel, padding_str)
+    gradient_mod = np.hypot(dy, dx)
 
     # Calculamos el angulo de la derivada en grados
     d_angle = np.arctan2(dy, dx)
@@ -318,17 +428,18 @@ def canny_channel(channel: np.ndarray, t1: int, t2: int, padding_str: PaddingStr
     d_angle = np.pi - d_angle
     d_angle = np.rad2deg(d_angle)
 
-    # Discretizamos dicho angulo
-    dir_sw = np.empty((*d_angle.shape, *kernel.shape))
-    dir_sw[((0 <= d_angle) & (d_angle < 22.5)) | ((157.5 <= d_angle) & (d_angle <= 180))]   = Direction.from_angle(0).kernel
-    dir_sw[(22.5 <= d_angle) & (d_angle < 67.5)]                                            = Direction.from_angle(45).kernel
-    dir_sw[(67.5 <= d_angle) & (d_angle < 112.5)]                                           = Direction.from_angle(90).kernel
-    dir_sw[(112.5 <= d_angle) & (d_angle < 157.5)]                                          = Direction.from_angle(135).kernel
+    # Discretizamos dicho angulo: [0, 22.5) => 0, [22.5, 67.5) => 1, ..., [157.5, 180] => 4 % 4 == 0
+    bucket = np.digitize(d_angle, CANNY_ANGLE_BINS) % 4
 
-    # Suprimimos los valores que no son maximos
-    max_suppression_sw = sliding_window(gradient_mod, kernel.shape, padding_str) * dir_sw
-    max_suppression_sw = np.max(max_suppression_sw, axis=(2, 3))
-    gradient_mod[max_suppression_sw != gradient_mod] = 0
+    # Suprimimos los valores que no son maximos en la direccion discretizada de cada pixel
+    padded = padding_str.pad(gradient_mod, kernel.shape)
+    rows, cols = gradient_mod.shape
+    direction_max = np.stack([
+        np.maximum.reduce([padded[1 + off_y:1 + off_y + rows, 1 + off_x:1 + off_x + cols] for off_y, off_x in offsets])
+        for offsets in CANNY_DIRECTION_OFFSETS
+    ])
+    max_suppression = np.take_along_axis(direction_max, bucket[np.newaxis], axis=0)[0]
+    gradient_mod[max_suppression != gradient_mod] = 0
 
     # Normalizamos la imagen antes del thresholding
     gradient_mod = normalize(gradient_mod, np.float64)
@@ -337,30 +448,19 @@ def canny_channel(channel: np.ndarray, t1: int, t2: int, padding_str: PaddingStr
     gradient_mod[gradient_mod >= t2] = MAX_COLOR
     gradient_mod[gradient_mod <= t1] = 0
 
-    max_row, max_col = gradient_mod.shape
-
-    # Arrastramos los bordes de manera vertical
-    for row in range(max_row):
-        for col in range(max_col):
-            canny_drag_borders(gradient_mod, t1, t2, max_col, max_row, row, col)
-
-    # Arrastramos los bordes de manera horizontal
-    for col in range(max_col):
-        for row in range(max_row):
-            canny_drag_borders(gradient_mod, t1, t2, max_col, max_row, row, col)
+    canny_hysteresis(gradient_mod, t1, t2)
 
     return gradient_mod
     
 def harris_channel(channel: np.ndarray, sigma:int, k: float, threshold: float, r_function: HarrisR, padding_str: PaddingStrategy, with_border: bool) -> Tuple[np.ndarray, ImageChannelTransformation]:
     # Usamos prewitt para derivar
-    kernel = FamousKernel.PREWITT.kernel
-    dx = weighted_sum(channel, kernel, padding_str)
-    kernel = np.rot90(kernel, k=-1)
-    dy = weighted_sum(channel, kernel, padding_str)
+    dx, dy = gradients(channel, FamousKernel.PREWITT.kernel, padding_str)
 
-    ix2 = weighted_sum(np.multiply(dx, dx), gauss_kernel(sigma), padding_str)
-    ixy = weighted_sum(np.multiply(dx, dy), gauss_kernel(sigma), padding_str)
-    iy2 = weighted_sum(np.multiply(dy, dy), gauss_kernel(sigma), padding_str)
+    # Las derivadas no se vuelven a usar => Calculamos los cuadrados in place, despues del producto cruzado
+    gauss = gauss_kernel(sigma)
+    ixy = weighted_sum(np.multiply(dx, dy), gauss, padding_str)
+    ix2 = weighted_sum(np.multiply(dx, dx, out=dx), gauss, padding_str)
+    iy2 = weighted_sum(np.multiply(dy, dy, out=dy), gauss, padding_str)
 
     r = r_function(ix2, ixy, iy2, k)
     r_abs = np.abs(r)
@@ -506,14 +606,24 @@ def is_exterior(val: int) -> bool:
 def is_interior(val: int) -> bool:
     return val < 0
 
-def check_surroundings(point: Tuple[int, int], phi: np.ndarray, indices: np.ndarray, condition) -> bool:
+# Los puntos cuyos vecinos (dentro de la imagen) cumplen la condicion dejan de ser borde: se les asigna new_value en phi.
+# Asignar new_value no cambia la condicion, asi que el orden no importa => Evaluamos todos los puntos de una, vectorizado.
+# Retorna los puntos que siguen siendo borde, en el orden original.
+def absorb_surrounded_points(points: List[Tuple[int, int]], phi: np.ndarray, indices: np.ndarray, condition, new_value: int) -> List[Tuple[int, int]]:
+    if not points:
+        return points
+
+    coords = np.array(points)
+    surrounded = np.ones(len(points), dtype=bool)
     for index in indices:
-        phi_y = point[0] + index[0]
-        phi_x = point[1] + index[1]
-        # Tengo que tener a alguien que sea mi borde contrario al lado
-        if in_bounds(phi_x, phi_y, phi.shape) and not condition(phi[phi_y, phi_x]):
-            return False
-    return True
+        phi_y = coords[:, 0] + index[0]
+        phi_x = coords[:, 1] + index[1]
+        inside = (0 <= phi_x) & (phi_x < phi.shape[1]) & (0 <= phi_y) & (phi_y < phi.shape[0])
+        neighbours = phi[np.clip(phi_y, 0, phi.shape[0] - 1), np.clip(phi_x, 0, phi.shape[1] - 1)]
+        surrounded &= ~inside | condition(neighbours)
+
+    phi[coords[surrounded, 0], coords[surrounded, 1]] = new_value
+    return [point for point, is_surrounded in zip(points, surrounded.tolist()) if not is_surrounded]
 
 def update_img_channel_transformation(img_channel_transformation: ImageChannelTransformation, active_outline_metrics: List[ActiveOutlineMetrics], phi: np.ndarray, switch, psi:np.ndarray, overlay: List[DrawCmd]):
     img_channel_transformation.internal_results['active_outline_metrics'] = active_outline_metrics
@@ -522,6 +632,16 @@ def update_img_channel_transformation(img_channel_transformation: ImageChannelTr
     img_channel_transformation.internal_results['switch'] = switch
     img_channel_transformation.overlay = overlay
 
+# Pixeles que se parecen mas al objeto que al fondo, segun el threshold.
+# La velocidad de cada pixel no depende del contorno => La calculamos vectorizada para toda la imagen, y no por punto en cada iteracion.
+def object_pixels_mask(image: np.ndarray, sigma_bg: Union[float, np.ndarray], sigma_obj: Union[float, np.ndarray], threshold: float) -> np.ndarray:
+    pixels = np.atleast_3d(image)
+    diff_bg = np.linalg.norm(sigma_bg - pixels, axis=2)
+    diff_obj = np.linalg.norm(sigma_obj - pixels, axis=2)
+    # Si diff_obj es 0, el pixel es del objeto sin importar el log
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (diff_obj == 0) | (np.log(diff_bg / diff_obj) >= threshold)
+
 def active_outline_all_channels(image: np.ndarray, threshold:float, sigma_bg: Union[float, np.ndarray], active_outline_metrics: List[ActiveOutlineMetrics], phi: np.ndarray, switch, psi:np.ndarray = None) -> Tuple[np.ndarray, ImageChannelTransformation]:
     indices_4 = np.array([[-1, 0], [0, -1], [1, 0], [0, 1]])
     overlay = []
@@ -534,33 +654,22 @@ def active_outline_all_channels(image: np.ndarray, threshold:float, sigma_bg: Un
         lin = section.lin
         sigma_obj = section.sigma
         section_number = section.section_number
+        is_object = object_pixels_mask(image, sigma_bg, sigma_obj, threshold)
         flag = True
         while flag:
             flag = False
             for point in lout:
-                diff_bg = np.linalg.norm(sigma_bg - image[point[0], point[1]])
-                diff_obj = np.linalg.norm(sigma_obj - image[point[0], point[1]])
-
-                if (diff_obj == 0 or np.log(diff_bg / diff_obj) >= threshold) and switch(point, lin, lout, phi, indices_4, -1, 3, section_number, psi):
+                if is_object[point[0], point[1]] and switch(point, lin, lout, phi, indices_4, -1, 3, section_number, psi):
                     flag = True
                 else:
                     new_lout.append(point)
             lout = new_lout
             new_lout = []
 
-            for point in lin:
-                if check_surroundings(point, phi, indices_4, is_interior):
-                    phi[point[0], point[1]] = -3
-                else:
-                    new_lin.append(point)
-            lin = new_lin
-            new_lin = []
+            lin = absorb_surrounded_points(lin, phi, indices_4, is_interior, -3)
 
             for point in lin:
-                diff_bg = np.linalg.norm(sigma_bg - image[point[0], point[1]])
-                diff_obj = np.linalg.norm(sigma_obj - image[point[0], point[1]])
-
-                if diff_obj == 0 or np.log(diff_bg / diff_obj) >= threshold:
+                if is_object[point[0], point[1]]:
                     new_lin.append(point)
                 else:
                     flag = True
@@ -569,13 +678,7 @@ def active_outline_all_channels(image: np.ndarray, threshold:float, sigma_bg: Un
             lin = new_lin
             new_lin = []
 
-            for point in lout:
-                if check_surroundings(point, phi, indices_4, is_exterior):
-                    phi[point[0], point[1]] = 3
-                else:
-                    new_lout.append(point)
-            lout = new_lout
-            new_lout = []
+            lout = absorb_surrounded_points(lout, phi, indices_4, is_exterior, 3)
 
         for i in range(5):
             gaussian_phi = gauss_channel(phi, 1, PaddingStrategy.EDGE)
@@ -587,13 +690,7 @@ def active_outline_all_channels(image: np.ndarray, threshold:float, sigma_bg: Un
             lout = new_lout
             new_lout = []
 
-            for point in lin:
-                if check_surroundings(point, phi, indices_4, is_interior):
-                    phi[point[0], point[1]] = -3
-                else:
-                    new_lin.append(point)
-            lin = new_lin
-            new_lin = []
+            lin = absorb_surrounded_points(lin, phi, indices_4, is_interior, -3)
 
             for point in lin:
                 if gaussian_phi[point[0], point[1]] > 0:
@@ -603,13 +700,7 @@ def active_outline_all_channels(image: np.ndarray, threshold:float, sigma_bg: Un
             lin = new_lin
             new_lin = []
 
-            for point in lout:
-                if check_surroundings(point, phi, indices_4, is_exterior):
-                    phi[point[0], point[1]] = 3
-                else:
-                    new_lout.append(point)
-            lout = new_lout
-            new_lout = []
+            lout = absorb_surrounded_points(lout, phi, indices_4, is_exterior, 3)
 
             overlay.append(ScatterDrawCmd(np.asarray(lout), section.lout_color))
             overlay.append(ScatterDrawCmd(np.asarray(lin), section.lin_color))
@@ -628,11 +719,11 @@ def directional(image: Image, kernel: FamousKernel, border_dir: Direction, paddi
 def high_pass(image: Image, kernel_size: int, padding_str: PaddingStrategy) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
     return image.apply_over_channels(high_pass_channel, kernel_size=kernel_size, padding_str=padding_str)
 
-def prewitt(image: Image, padding_str: PaddingStrategy) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
-    return image.apply_over_channels(prewitt_channel, padding_str=padding_str)
+def prewitt(image: Image, padding_str: PaddingStrategy, use_l1_magnitude: bool = False) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
+    return image.apply_over_channels(prewitt_channel, padding_str=padding_str, use_l1_magnitude=use_l1_magnitude)
 
-def sobel(image: Image, padding_str: PaddingStrategy) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
-    return image.apply_over_channels(sobel_channel, padding_str=padding_str)
+def sobel(image: Image, padding_str: PaddingStrategy, use_l1_magnitude: bool = False) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
+    return image.apply_over_channels(sobel_channel, padding_str=padding_str, use_l1_magnitude=use_l1_magnitude)
 
 def laplace(image: Image, crossing_threshold: int, padding_str: PaddingStrategy) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
     return image.apply_over_channels(laplacian_channel, crossing_threshold=crossing_threshold, padding_str=padding_str)
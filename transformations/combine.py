@@ -2,7 +2,7 @@ from typing import Tuple, List
 import numpy as np
 import cv2
 
-from models.image import Image, ImageChannelTransformation, normalize
+from models.image import Image, ImageChannelTransformation, min_max_normalize
 from transformations.data_models import Measurement
 
 
@@ -14,8 +14,8 @@ def sift_channel(channel1: np.ndarray, channel2: np.ndarray, features: int, laye
         raise ValueError(f'If multi channel, color must be a shade of gray. This means all elements of tuple must be the same value. Not true for {color}')
 
     # Normalizamos porque OpenCV solo se banca uint8
-    data1 = normalize(channel1)
-    data2 = normalize(channel2)
+    data1 = min_max_normalize(channel1)
+    data2 = min_max_normalize(channel2)
 
     # Parametros propios del metodo:
     # features:     Cantidad de keypoints a tomar
@@ -56,13 +56,13 @@ def sift_channel(channel1: np.ndarray, channel2: np.ndarray, features: int, laye
 # ******************* Export Functions ********************** #
 
 def add(first_img: Image, second_img: Image) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
-    return np.add(first_img.data, second_img.data), []
+    return np.add(first_img.as_float(), second_img.data), []
 
 def sub(first_img: Image, second_img: Image) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
-    return np.subtract(first_img.data, second_img.data), []
+    return np.subtract(first_img.as_float(), second_img.data), []
 
 def multiply(first_img: Image, second_img: Image) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
-    return np.multiply(first_img.data, second_img.data), []
+    return np.multiply(first_img.as_float(), second_img.data), []
 
 def sift(img1: Image, img2: Image, features: int = 0, layers: int = 3, contrast_t: float = 0.04, edge_t: float = 10, sigma: float = 1.6, match_t: float = 200, cross_check: bool = True) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
     multi_channel = img1.is_multi_channel()
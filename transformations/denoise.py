@@ -75,7 +75,7 @@ def gauss_channel(channel: np.ndarray, sigma: float, padding_str: PaddingStrateg
 MAX_ANISOTROPIC_ITERATIONS: int = 20
 def diffusion_step(channel: np.ndarray, sigma: int, padding_str: PaddingStrategy, function: DiffusionStrategy) -> np.ndarray:
     sw = sliding_window(channel, DirectionalDerivatives.kernel_size(), padding_str)
-    new_channel = channel.copy()
+    new_channel = channel.astype(np.float64)
     for kernel in DirectionalDerivatives.values():
         derivatives = np.sum(sw[:, :] * kernel, axis=(2, 3))
         new_channel += function(derivatives, sigma) * derivatives / 4
@@ -135,4 +135,4 @@ def diffusion(img: Image, iterations: int, sigma: int, padding_str: PaddingStrat
     return img.apply_over_channels(diffusion_channel, iterations, sigma, padding_str, function)
 
 def bilateral(image: Image, sigma_space: int, sigma_intensity: int, padding_str: PaddingStrategy) -> Tuple[np.ndarray, List[ImageChannelTransformation]]:
-    return bilateral_all_channels(image.data, sigma_space, sigma_intensity, padding_str), []
+    return bilateral_all_channels(image.as_float(), sigma_space, sigma_intensity, padding_str), []
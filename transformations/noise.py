@@ -32,7 +32,7 @@ def pollute_channel(channel: np.ndarray, noise_supplier: NoiseSupplier, noise_ty
     n = int(channel.size * p)
     shape = np.shape(channel)
     indices = rng.rng.choice(channel.size, n, replace=False) 
-    ret = channel.flatten()
+    ret = channel.astype(np.float64).reshape(-1)
     noise = noise_supplier(n)
     ret[indices] = noise_type(ret[indices], noise)
     return np.reshape(ret, shape)
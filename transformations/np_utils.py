@@ -1,13 +1,20 @@
+import functools
+
 import numpy as np
 
 
 def index_matrix(x: int, y: int) -> np.ndarray:
-    # return np.indices((x,y)).reshape(2,-1).reshape(-1, order='F').reshape(x,y,2)
-    return np.array(list(np.ndindex(x, y))).reshape((x, y, 2))
+    # matrix[i, j] == [i, j]
+    return np.stack(np.indices((x, y)), axis=-1)
     
+# El kernel solo depende de sigma y se pide repetidamente (ej: en cada iteracion de contornos activos) => Lo cacheamos.
+# Es de solo lectura, para que nadie pueda modificar la version cacheada.
+@functools.lru_cache(maxsize=32)
 def gauss_kernel(sigma: float) -> np.ndarray:
     kernel_size = int(sigma * 2 + 1)
     indices = index_matrix(kernel_size, kernel_size) - kernel_size//2
     indices = np.sum(indices**2, axis=2)
     indices = np.exp(-indices / sigma**2)
-    return indices / (2 * np.pi * sigma**2)
\ No newline at end of file
+    kernel = indices / (2 * np.pi * sigma**2)
+    kernel.flags.writeable = False
+    return kernel
\ No newline at end of file
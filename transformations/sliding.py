@@ -1,6 +1,6 @@
 from enum import Enum
 import functools
-from typing import Tuple
+from typing import Iterable, Tuple
 
 import numpy as np
 
@@ -49,3 +49,12 @@ def weighted_sum(channel: np.ndarray, kernel: np.ndarray, padding_str: PaddingSt
     require_valid_kernel(kernel)
     sw = sliding_window(channel, kernel.shape, padding_str)
     return np.sum(sw[:, :] * kernel, axis=(2, 3))
+
+# Aplica varios kernels (de la misma forma) sobre una unica sliding window, en vez de paddear y recorrer el canal por cada uno.
+# einsum reduce directo, sin materializar el producto de la ventana con el kernel.
+def weighted_sums(channel: np.ndarray, kernels: Iterable[np.ndarray], padding_str: PaddingStrategy) -> Tuple[np.ndarray, ...]:
+    kernels = tuple(kernels)
+    for kernel in kernels:
+        require_valid_kernel(kernel)
+    sw = sliding_window(channel, kernels[0].shape, padding_str)
+    return tuple(np.einsum('ijkl,kl->ij', sw, kernel) for kernel in kernels)
@@ -1,13 +1,14 @@
 from typing import Tuple, List
 import numpy as np
 
-from models.image import Image, MAX_COLOR, ImageChannelTransformation, channel_histogram
+from models.image import Image, MAX_COLOR, ImageChannelTransformation, channel_histogram, vectorized_over_channels
 
 def binary_threshold(channel: np.ndarray, threshold:int) -> np.ndarray:
     ret = np.zeros(channel.shape)
     ret[channel > threshold] = MAX_COLOR
     return ret
 
+@vectorized_over_channels
 def channel_threshold(channel: np.ndarray, threshold: int) -> np.ndarray:
     return binary_threshold(channel, threshold)
 
@@ -34,8 +35,10 @@ def channel_otsu(channel: np.ndarray) -> Tuple[np.ndarray, ImageChannelTransform
     p = p[:-1]
     m = m[:-1]
 
-    intra_variance = (mg*p - m)**2 / (p * (1-p))
-    max_variance = np.ravel(np.where(intra_variance == np.amax(intra_variance)))
+    # Los umbrales que dejan una clase vacia no estan definidos (0/0) => Los ignoramos
+    with np.errstate(divide='ignore', invalid='ignore'):
+        intra_variance = (mg*p - m)**2 / (p * (1-p))
+    max_variance = np.ravel(np.where(intra_variance == np.nanmax(intra_variance)))
     t = int(max_variance.mean().round())
 
     return binary_threshold(channel, t), ImageChannelTransformation({'selected_threshold': t}, {})